@@ -1,14 +1,32 @@
 #!/usr/bin/env python3
 '''.'''
+import asyncio
+import concurrent.futures
+import functools
+import io
+import re
 import requests
+import requests.adapters
 import sqlite3
 import string
 import decimal
-#import pandas
+import aiohttp
+import aiohttp_client_cache
+import lxml.html
+import pandas
+import requests_cache
 from sql_ops import SQLOps
 
 
 SHIPS_BY_STATS_URL = 'https://azurlane.koumakan.jp/List_of_Ships_by_Stats'
+SHIP_URL = 'https://azurlane.koumakan.jp/{}'
+MAX_FETCHES = 20
+FETCH_TIMEOUT = 60
+FETCH_RETRIES = 3
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+HTTP_CACHE = 'shipgirls_http'
+HTTP_CACHE_EXPIRY = 86400
+HEADERS = {'User-Agent': 'shipgirls (+https://github.com/mayafox/shipgirls)'}
 NEW_HEADERS = ['id', 'ship_name', 'rarity', 'nation', 'type',
                'health', 'firepower', 'aa', 'torpedo', 'evasion', 'air_power',
                'fuel_consumption', 'reload', 'armor', 'speed', 'asw',
@@ -16,77 +34,149 @@ NEW_HEADERS = ['id', 'ship_name', 'rarity', 'nation', 'type',
 NEW_HEADER_TYPES = ['text', 'text', 'text', 'text', 'text', 'real', 'real',
                     'real', 'real', 'real', 'real', 'real', 'real', 'text',
                     'real', 'real', 'real', 'real']
-TABLE_MAP = {}
-TABLE_MAP['dd'] = {'table': 'dd', 'index': 1}
-TABLE_MAP['cl'] = {'table': 'cl', 'index': 4}
-TABLE_MAP['ca'] = {'table': 'ca', 'index': 7}
-TABLE_MAP['bb'] = {'table': 'bb', 'index': 10}
-TABLE_MAP['bc'] = {'table': 'bc', 'index': 13}
-TABLE_MAP['bm'] = {'table': 'bm', 'index': 16}
-TABLE_MAP['cv'] = {'table': 'cv', 'index': 19}
-TABLE_MAP['cvl'] = {'table': 'cvl', 'index': 22}
-TABLE_MAP['ar'] = {'table': 'ar', 'index': 25}
-TABLE_MAP['colab'] = {'table': 'colab', 'index': 28}
-TABLE_MAP['retro'] = {'table': 'retro', 'index': 30}
-NUMERICS = string.digits + '.'
+TABLE_MAP = {'dd': {'table': 'dd', 'index': 1},
+             'cl': {'table': 'cl', 'index': 4},
+             'ca': {'table': 'ca', 'index': 7},
+             'bb': {'table': 'bb', 'index': 10},
+             'bc': {'table': 'bc', 'index': 13},
+             'bm': {'table': 'bm', 'index': 16},
+             'cv': {'table': 'cv', 'index': 19},
+             'cvl': {'table': 'cvl', 'index': 22},
+             'ar': {'table': 'ar', 'index': 25},
+             'colab': {'table': 'colab', 'index': 28},
+             'retro': {'table': 'retro', 'index': 30}}
+RARITY_BY_STARS = {4: 'common', 5: 'rare/elite', 6: 'super rare'}
+NUMERICS = frozenset(string.digits + '.')
+# The database only lives for one run, so skip journalling and syncing.
+FAST_PRAGMAS = ['journal_mode=OFF', 'synchronous=OFF', 'temp_store=MEMORY',
+                'locking_mode=EXCLUSIVE', 'cache_size=-200000']
+NOT_UPPERCASE = re.compile('[^{}]'.format(string.ascii_uppercase))
+# pandas.read_html skips tables with no text or no rows, keep the same
+# indices.
+TABLE_TEXT = re.compile('.+')
+
+
+def http_session():
+    # The stats index is one blocking requests call and the ship pages go
+    # through aiohttp, and neither cache library wraps the other client, so
+    # each side keeps its own cache file.
+    session = requests_cache.CachedSession(HTTP_CACHE, backend='sqlite',
+                                           expire_after=HTTP_CACHE_EXPIRY)
+    session.headers.update(HEADERS)
+    session.mount('https://', requests.adapters.HTTPAdapter(
+        pool_connections=MAX_FETCHES, pool_maxsize=MAX_FETCHES,
+        max_retries=3))
+    return session
 
 
 def validate_modifier(mod_string):
-    ret_value = True
-    for char in mod_string:
-        if char not in NUMERICS:
-            ret_value = False
-    return ret_value
+    return NUMERICS.issuperset(mod_string)
 
 
+@functools.lru_cache(maxsize=512)
 def base_stat_lookup(equipment):
-    if 'main' in equipment.lower():
+    equipment = equipment.lower()
+    if 'main' in equipment:
         return 'firepower'
-    if 'anti-air' in equipment.lower():
+    if 'anti-air' in equipment:
         return 'aa'
-    if 'torpedoes' in equipment.lower():
+    if 'torpedoes' in equipment:
         return 'torpedo'
     return 'air_power'
 
 
-def get_rarity(ship_data, index):
-    if str(ship_data[index][1][1]).lower() != 'nan':
-        if len(ship_data[index][1][1]) == 4:
-            return 'common'
-        if len(ship_data[index][1][1]) == 5:
-            return 'rare/elite'
-        if len(ship_data[index][1][1]) == 6:
-            return 'super rare'
-    return ''
+def get_rarity(rarity):
+    return RARITY_BY_STARS.get(len(rarity), '')
+
+
+def html_tables(content):
+    return [table for table in lxml.html.fromstring(content).xpath('//table')
+            if TABLE_TEXT.search(table.text_content())
+            and table.xpath('.//tr')]
+
+
+def read_table(table):
+    table_html = lxml.html.tostring(table, encoding='unicode')
+    return pandas.read_html(io.StringIO(table_html), flavor='lxml')[0]
+
+
+def table_cell(rows, row, column):
+    try:
+        return rows[row][column]
+    except IndexError:
+        return ''
+
+
+def own_text(table):
+    # Text of this table's cells, leaving out any tables nested inside and
+    # anything the page does not display.
+    depth = table.xpath('count(ancestor-or-self::table)')
+    return ''.join(table.xpath(
+        './/text()[count(ancestor::table) = $depth]'
+        '[not(ancestor::style)]'
+        '[not(ancestor::*[contains(translate(@style, " ", ""),'
+        ' "display:none")])]', depth=depth))
+
+
+def table_rows(table):
+    rows = table.xpath('./tr|./thead/tr|./tbody/tr')
+    # Leading rows of only <th> cells are the header, as in read_html.
+    while rows and not rows[0].xpath('./td'):
+        rows = rows[1:]
+    texts = []
+    # Column -> (text, rows left) for cells spanning down from above.
+    spans = {}
+    for row in rows:
+        row_texts = []
+        carried, spans = spans, {}
+        for cell in row.xpath('./th|./td') + [None]:
+            while len(row_texts) in carried:
+                text, left = carried.pop(len(row_texts))
+                if left > 1:
+                    spans[len(row_texts)] = (text, left - 1)
+                row_texts.append(text)
+            if cell is None:
+                break
+            text = cell.text_content().strip()
+            rowspan = int(cell.get('rowspan', 1))
+            for _ in range(int(cell.get('colspan', 1))):
+                if rowspan > 1:
+                    spans[len(row_texts)] = (text, rowspan - 1)
+                row_texts.append(text)
+        texts.append(row_texts)
+    return texts
 
 
 def import_ships(content, db, table):
-    ship_list = pandas.read_html(content)
+    ship_list = html_tables(content)
+    rows = []
     for key in TABLE_MAP.keys():
-        ship_list[TABLE_MAP[key]['index']].to_sql(TABLE_MAP[key]['table'],
-                                                  db.database)
-        db.cursor.execute('DELETE from "{}"'.format(TABLE_MAP[key]['table'])
-                          + ' where "index" is 0')
-        for row in db.select_rows(
-              table_name=TABLE_MAP[key]['table']).fetchall():
-            clean_row = list(row)[1:]
-            clean_row[4] = ''.join([x for x in list(clean_row[4])[:5]
-                                    if x in string.ascii_uppercase][:-1])
-            clean_row[-4] = float(clean_row[-4])
-            row_data = {}
-            for index, key in enumerate(NEW_HEADERS):
-                row_data[key] = clean_row[index]
-            db.add_row(row_data=row_data, table_name=table)
-    for tmp_table in [name for name in db.get_tables() if name != table]:
-        db.cursor.execute('DROP TABLE {}'.format(tmp_table))
+        # The first body row of each stats table is not a ship.
+        type_rows = table_rows(ship_list[TABLE_MAP[key]['index']])[1:]
+        for row in type_rows:
+            # Missing or extra cells would shift every column after them.
+            if len(row) != len(NEW_HEADERS):
+                raise ValueError('Stats table {} has a row with {} cells, '
+                                 'expected {}.'.format(key, len(row),
+                                                       len(NEW_HEADERS)))
+        rows.extend(type_rows)
+    ships = pandas.DataFrame(rows, columns=NEW_HEADERS)
+    ships['type'] = ships['type'].str[:5].str.replace(NOT_UPPERCASE, '',
+                                                      regex=True).str[:-1]
+    ships['speed'] = ships['speed'].astype(float)
+    # A NULL ordinal leaves the numbering to the INTEGER PRIMARY KEY.
+    db.add_rows(row_data=((None,) + row for row in
+                          ships.itertuples(index=False, name=None)),
+                table_name=table)
     return
 
 
-def get_equip(ship_data, index, record):
-    for row, slot in enumerate(list(ship_data[index][0][2:])):
-        row_index = row + 2
+def get_equip(ship_table, record):
+    modifiers = ship_table[1]
+    equipment = ship_table[2]
+    for row_index, slot in enumerate(ship_table[0].iloc[2:], 2):
         row_id = 'slot_{}'.format(slot)
-        mod_string = ship_data[index][1][row_index]
+        mod_string = modifiers[row_index]
         modifier = mod_string.replace('%', '').split('/')[-1]
         if not validate_modifier(str(modifier)):
             modifier = '0'
@@ -96,18 +186,69 @@ def get_equip(ship_data, index, record):
         equip_key = row_id + '_equipment'
         effect_key = row_id + '_effective'
         record[mod_key] = float(modifier)/100
-        record[equip_key] = ship_data[index][2][row_index]
+        record[equip_key] = equipment[row_index]
         slot_base_stat = base_stat_lookup(record[equip_key])
         eff_value = record[slot_base_stat] * record[mod_key]
         record[effect_key] = eff_value
     return record
 
 
+def parse_ship(record, ship_html):
+    for table in html_tables(ship_html):
+        table_text = own_text(table)
+        rows = table_rows(table)
+        # Rarity and nationality are single cells, skip read_html for them.
+        if 'Rarity' in table_text:
+            record['rarity'] = get_rarity(table_cell(rows, 1, 1))
+        if 'Nationality' in table_text:
+            record['nation'] = table_cell(rows, 1, 1)
+        if 'Equipment' in table_cell(rows, 0, 0):
+            record = get_equip(read_table(table), record)
+    return record
+
+
+async def fetch_ship(session, semaphore, record):
+    name = record['ship_name'].replace(' ', '_')
+    for attempt in range(FETCH_RETRIES + 1):
+        if attempt:
+            # Back off outside the semaphore so other ships keep fetching.
+            await asyncio.sleep(2 ** (attempt - 1))
+        try:
+            async with semaphore:
+                async with session.get(SHIP_URL.format(name)) as ship_html:
+                    if ship_html.status == 200:
+                        return await ship_html.read()
+                    error = 'HTTP {}'.format(ship_html.status)
+                    if ship_html.status not in RETRY_STATUSES:
+                        break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            error = repr(exc)
+    print('Failed to fetch ship: {} ({})'.format(record['ship_name'], error))
+    return None
+
+
+async def fetch_ships(records):
+    semaphore = asyncio.Semaphore(MAX_FETCHES)
+    connector = aiohttp.TCPConnector(limit=MAX_FETCHES)
+    timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+    cache = aiohttp_client_cache.SQLiteBackend(HTTP_CACHE + '_ships',
+                                               expire_after=HTTP_CACHE_EXPIRY)
+    async with aiohttp_client_cache.CachedSession(cache=cache,
+                                                  connector=connector,
+                                                  timeout=timeout,
+                                                  headers=HEADERS) as session:
+        return await asyncio.gather(*(fetch_ship(session, semaphore, record)
+                                      for record in records))
+
+
 def main():
     table = 'master'
     db = SQLOps(filename=':memory:', row_factory=True)
+    for pragma in FAST_PRAGMAS:
+        db.cursor.execute('PRAGMA {};'.format(pragma))
     db.create_table(table, NEW_HEADERS, NEW_HEADER_TYPES, ordinal=True)
-    ship_list_html = requests.get(SHIPS_BY_STATS_URL)
+    with http_session() as session:
+        ship_list_html = session.get(SHIPS_BY_STATS_URL)
     if ship_list_html.status_code == 200:
         import_ships(content=ship_list_html.content, db=db, table=table)
     types = set([row['type'] for row in
@@ -116,23 +257,23 @@ def main():
     for ship_type in types:
         db.create_table(ship_type.lower(), NEW_HEADERS,
                         NEW_HEADER_TYPES, ordinal=True)
-    for row in db.select_rows(table_name=table).fetchall():
-        record = dict(zip(db.get_column_names(table), row))
-        name = record['ship_name'].replace(' ', '_')
-        ship_url = 'https://azurlane.koumakan.jp/{}'.format(name)
-        ship_html = requests.get(ship_url)
-        if ship_html.status_code == 200:
-            ship_data = pandas.read_html(ship_html.content)
-            print('Fetched data for ship: {}'.format(record['ship_name']))
-            for index, data in enumerate(ship_data):
-                if 'Rarity' in str(ship_data[index]):
-                    record['rarity'] = get_rarity(ship_data, index)
-                if 'Nationality' in str(ship_data[index]):
-                    record['nation'] = ship_data[index][1][1]
-                if 'Equipment' in str(ship_data[index][0][0]):
-                    record = get_equip(ship_data, index, record)
-            db.add_row(row_data=record, table_name=table)
-            db.add_row(row_data=record, table_name=record['type'].lower())
+    columns = db.get_column_names(table)
+    records = [dict(zip(columns, row))
+               for row in db.select_rows(table_name=table).fetchall()]
+    ship_pages = asyncio.run(fetch_ships(records))
+    pages = [page for page in ship_pages if page is not None]
+    records = [record for record, page in zip(records, ship_pages)
+               if page is not None]
+    # Page parsing is CPU bound, spread it over every core.
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        fetched = list(executor.map(parse_ship, records, pages, chunksize=8))
+    for record in fetched:
+        print('Fetched data for ship: {}'.format(record['ship_name']))
+    db.add_rows(row_data=fetched, table_name=table)
+    for ship_type in types:
+        db.add_rows(row_data=[record for record in fetched
+                              if record['type'] == ship_type],
+                    table_name=ship_type.lower())
     db.export_csv(table_name=table, filename='data.csv')
     for ship_type in types:
         db.export_csv(table_name=ship_type.lower(),
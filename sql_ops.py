@@ -3,7 +3,16 @@
 
 import sqlite3
 import csv
+import itertools
 import time
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:
+    pyarrow = None
+
+# Marks an exhausted iterator, None can be a (bad) row of its own.
+_EMPTY = object()
 
 
 class SQLOps(object):
@@ -42,12 +51,14 @@ class SQLOps(object):
             self.rotation_interval = db_rotation_time
         if self.base_filename != ':memory:' and self.rotation_interval != 0:
             self.start_time = int(time.time())
+            # add_row checks this on every insert, monotonic() is cheaper.
+            self.__rotate_at = time.monotonic() + self.rotation_interval
             filename = self.base_filename + '_{}.db'.format(self.start_time)
         else:
             if (self.base_filename != ':memory:'
                     and self.rotation_interval != 0):
                 raise ValueError('db_rotation_time must be 0 if using '
-                                 + ':memory:.')
+                                 ':memory:.')
             if self.base_filename != ':memory:':
                 filename = self.base_filename + '.db'
             else:
@@ -56,8 +67,37 @@ class SQLOps(object):
         if row_factory:
             self.database.row_factory = sqlite3.Row
         self.cursor = self.database.cursor()
-        self.__valid_types = ['text', 'integer', 'numeric', 'real', 'none']
+        self.__apply_pragmas(filename)
+        self.__valid_types = frozenset(['text', 'integer', 'numeric', 'real',
+                                        'none'])
         self.__ordinals = {}
+        self.__schema = {}
+        self.__statements = {}
+        self.__inserters = {}
+        self.__quoted = {}
+        return
+
+    def __apply_pragmas(self, filename):
+        # Pragmas are per connection, so every new connection needs them.
+        self.__wal = filename != ':memory:'
+        self.__checkpointed = 0
+        if self.__wal:
+            self.cursor.execute('PRAGMA journal_mode=WAL;')
+        for pragma in ['synchronous=NORMAL', 'temp_store=MEMORY',
+                       'cache_size=-8000', 'mmap_size=268435456',
+                       'journal_size_limit=6144000',
+                       'wal_autocheckpoint=1000']:
+            self.cursor.execute('PRAGMA {};'.format(pragma))
+        return
+
+    def __checkpoint_wal(self):
+        # Readers can hold off the automatic checkpoints, so truncate the
+        # WAL ourselves every 10000 changed rows once writes are committed.
+        changes = self.database.total_changes - self.__checkpointed
+        if (self.__wal and not self.database.in_transaction
+                and changes >= 10000):
+            self.cursor.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+            self.__checkpointed = self.database.total_changes
         return
 
     def check_types(self, types):
@@ -74,13 +114,9 @@ class SQLOps(object):
             True - all field types are valid
             False - one or more field types are invalid
         """
-        state = True
         if isinstance(types, str):
             types = types.split()
-        for item in types:
-            if item not in self.__valid_types:
-                state = False
-        return state
+        return all(item in self.__valid_types for item in types)
 
     def get_tables(self):
         """Get table names from the database.
@@ -90,10 +126,9 @@ class SQLOps(object):
             List of the table names in the database.
 
         """
-        return [x[0] for x in self.cursor.execute('SELECT name FROM '
-                                                  + 'sqlite_master WHERE type '
-                                                  + '= "table" ORDER BY name;'
-                                                  ).fetchall()]
+        return [x[0] for x in self.cursor.execute(
+            'SELECT name FROM sqlite_master WHERE type = "table" '
+            'ORDER BY name;').fetchall()]
 
     def table_exists(self, table_name="table"):
         """Check if the specified table is present in the database.
@@ -109,7 +144,9 @@ class SQLOps(object):
             True - table is present in the database.
             False - table is not present in the database.
         """
-        return table_name in self.get_tables()
+        return self.cursor.execute(
+            'SELECT 1 FROM sqlite_master WHERE type = "table" '
+            'AND name = ? LIMIT 1;', (table_name,)).fetchone() is not None
 
     def drop_table(self, table_name="table"):
         """Drops the specified table from the database.
@@ -124,14 +161,38 @@ class SQLOps(object):
         None
 
         """
-        if self.table_exists():
-            self.cursor.execute('DROP TABLE IF EXISTS '
-                                + '"{}";'.format(table_name))
+        if self.table_exists(table_name):
+            self.cursor.execute('DROP TABLE IF EXISTS {};'.format(
+                self.__quote(table_name)))
+        self.__forget_table(table_name)
         return
 
-    @staticmethod
-    def __sql_pragma_table(table_name='table'):
-        return 'PRAGMA table_info("{}");'.format(table_name)
+    def __quote(self, name):
+        if name not in self.__quoted:
+            self.__quoted[name] = '"{}"'.format(name.replace('"', '""'))
+        return self.__quoted[name]
+
+    def __sql_pragma_table(self, table_name='table'):
+        return 'PRAGMA table_info({});'.format(self.__quote(table_name))
+
+    def __forget_table(self, table_name):
+        self.__schema.pop(table_name, None)
+        self.__statements.pop(table_name, None)
+        self.__inserters.pop(table_name, None)
+        return
+
+    def __load_schema(self, table_name):
+        if table_name in self.__schema:
+            return self.__schema[table_name]
+        info = self.cursor.execute(
+            self.__sql_pragma_table(table_name)).fetchall()
+        schema = {'names': [x[1] for x in info],
+                  'types': [x[2] for x in info],
+                  'pk': [x[5] for x in info]}
+        # A missing table reads as no columns, it may still be created later.
+        if info:
+            self.__schema[table_name] = schema
+        return schema
 
     def get_column_names(self, table_name="table"):
         """Returns the column names for the specified table
@@ -147,8 +208,7 @@ class SQLOps(object):
             List containing the column names as ordered in the table.
 
         """
-        return [x[1] for x in self.cursor.execute(
-            self.__sql_pragma_table(table_name)).fetchall()]
+        return list(self.__load_schema(table_name)['names'])
 
     def get_column_types(self, table_name="table"):
         """Returns the sql data types for the columns.
@@ -164,20 +224,19 @@ class SQLOps(object):
             List of the sql data types as ordered in the table.
 
         """
-        return [x[2] for x in self.cursor.execute('PRAGMA table_info'
-                                                  + '("{}")'.format(table_name)
-                                                  + ';').fetchall()]
+        return list(self.__load_schema(table_name)['types'])
 
     def column_is_pk(self, column_name, table_name="table"):
-        return [x[5] for x in self.cursor.execute(
-            self.__sql_pragma_table(table_name)).fetchall()
-                if x[1] == column_name]
+        schema = self.__load_schema(table_name)
+        if column_name in schema['names']:
+            return [schema['pk'][schema['names'].index(column_name)]]
+        return []
 
     def get_pk_name(self, table_name="table"):
-        value = [x for x in self.get_column_names(table_name)
-                 if self.column_is_pk(x, table_name)]
-        if value:
-            return value[0]
+        schema = self.__load_schema(table_name)
+        for (name, pk) in zip(schema['names'], schema['pk']):
+            if pk:
+                return name
         return []
 
     def column_exists(self, column_name, table_name="table"):
@@ -197,7 +256,7 @@ class SQLOps(object):
             False -  Column does not exist in the table.
 
         """
-        return column_name in self.get_column_names(table_name)
+        return column_name in self.__load_schema(table_name)['names']
 
     def add_column(self, name, sql_type, key=False, table_name='table'):
         """Add a single column to a table.
@@ -223,13 +282,12 @@ class SQLOps(object):
             raise ValueError('ERROR: type is not a valid sql data type.')
         if self.column_exists(name, table_name):
             raise Exception('ERROR: Column already exists in the table.')
-        sql_call = 'ALTER TABLE "{}" '.format(table_name)
-        sql_call = sql_call + 'ADD COLUMN \'{}\' \'{}\''.format(name, sql_type)
-        if key:
-            sql_call = sql_call + ' PRIMARY KEY'
-        sql_call = sql_call + ';'
+        sql_call = 'ALTER TABLE {} ADD COLUMN {} \'{}\'{};'.format(
+            self.__quote(table_name), self.__quote(name), sql_type,
+            ' PRIMARY KEY' if key else '')
         if not self.column_exists(name, table_name):
             self.cursor.execute(sql_call)
+            self.__forget_table(table_name)
         return
 
     def create_table(self, table_name, col_list, type_list, drop=False,
@@ -257,7 +315,6 @@ class SQLOps(object):
         None
 
         """
-        sql_call = ''
         if not self.check_types(type_list):
             print('ERROR: One or more of the SQL data types are invalid.')
         if not drop and self.table_exists(table_name):
@@ -270,26 +327,22 @@ class SQLOps(object):
                     key = col == key_name
                     self.add_column(col, sql_type, key, table_name)
         else:
-            sql_call = 'CREATE TABLE {}'.format(table_name) + '('
             if ordinal:
                 key_name = 'ordinal'
                 if 'ordinal' not in col_list:
-                    new_col_list = ['ordinal'] + col_list
-                    new_type_list = ['integer'] + type_list
-                else:
-                    new_col_list = col_list
-                    new_type_list = type_list
+                    col_list = ['ordinal'] + col_list
+                    type_list = ['integer'] + type_list
                 self.__ordinals[table_name] = 1
-            for (col, sql_type) in zip(new_col_list, new_type_list):
-                sql_call = sql_call + "'{}' {}".format(col, sql_type)
+            columns = []
+            for (col, sql_type) in zip(col_list, type_list):
                 if col == key_name:
-                    sql_call = sql_call + ' PRIMARY KEY, '
+                    columns.append('{} {} PRIMARY KEY'.format(
+                        self.__quote(col), sql_type))
                 else:
-                    if col == col_list[-1]:
-                        sql_call = sql_call + ');'
-                    else:
-                        sql_call = sql_call + ', '
-        self.cursor.execute(sql_call)
+                    columns.append('{} {}'.format(self.__quote(col), sql_type))
+            self.cursor.execute('CREATE TABLE {} ({});'.format(
+                self.__quote(table_name), ', '.join(columns)))
+        self.__forget_table(table_name)
         return
 
     def select_rows(self, col_name='*', sql_filter='',
@@ -305,7 +358,8 @@ class SQLOps(object):
             SQL query language to use for limiting the selection.
             Default is '' (none)
         table_name : string
-            Name of the table to operate on.
+            Name of the table to operate on. Plain names are quoted, names
+            containing '.' or '"' (such as 'main.dogs') are used as written.
 
         Returns
         -------
@@ -326,13 +380,16 @@ class SQLOps(object):
                 print([list(record)])
                 record = mydb.cursor.fetchone()
         """
-        sql_call = 'SELECT {} FROM {}'.format(col_name, table_name)
+        if '.' in table_name or '"' in table_name:
+            source = table_name
+        else:
+            source = self.__quote(table_name)
+        sql_parts = ['SELECT {} FROM {}'.format(col_name, source)]
         if sql_filter:
-            sql_call = sql_call + ' WHERE {}'.format(sql_filter)
+            sql_parts.append('WHERE {}'.format(sql_filter))
         if ordering:
-            sql_call = sql_call + ' ORDER BY {}'.format(ordering)
-        sql_call = sql_call + ';'
-        return self.cursor.execute(sql_call)
+            sql_parts.append('ORDER BY {}'.format(ordering))
+        return self.cursor.execute(' '.join(sql_parts) + ';')
 
     def get_next_ordinal(self, table_name='table'):
         """Gets the next unique ordinal value for ordinal based tables.
@@ -349,57 +406,68 @@ class SQLOps(object):
 
         """
         if self.column_exists('ordinal', table_name):
-            current_id = self.select_rows(col_name='ordinal',
-                                          table_name=table_name).fetchall()
-            if not current_id:
+            # ordinal is the INTEGER PRIMARY KEY, so MAX reads one b-tree leaf.
+            current_id = self.select_rows(col_name='MAX(ordinal)',
+                                          table_name=table_name).fetchone()[0]
+            if current_id is None:
                 return self.__ordinals[table_name]
-            return current_id[-1][0] + 1
+            return current_id + 1
         else:
             raise Exception('no ordinal column in table'.format(table_name))
 
     def __sql_gen_tuple(self, table_name):
-        sql_call = 'INSERT OR REPLACE INTO {}'.format(table_name) + '('
-        sql_call = sql_call + ', '.join(self.get_column_names(table_name))
-        sql_call = sql_call + ') VALUES ('
-        dummy = ['?'] * len(self.get_column_names(table_name))
-        sql_call = sql_call + ', '.join(dummy) + ');'
-        return sql_call
+        columns = self.get_column_names(table_name)
+        names = [self.__quote(key) for key in columns]
+        return 'INSERT OR REPLACE INTO {}({}) VALUES ({});'.format(
+            self.__quote(table_name), ', '.join(names),
+            ', '.join(['?'] * len(columns)))
 
     def __sql_gen_dict(self, table_name):
-        sql_call = 'INSERT OR REPLACE INTO {}'.format(table_name) + "('"
-        sql_call = sql_call + "', '".join(self.get_column_names(table_name))
-        sql_call = sql_call + "') VALUES ("
-        for key in self.get_column_names(table_name):
-            if '.' in key:
-                new_key = key.replace('.', '_')
-                self.row[new_key] = self.row[key]
-                sql_call = sql_call + ':{}'.format(new_key)
-            else:
-                sql_call = sql_call + ':{}'.format(key)
-            if key == self.get_column_names(table_name)[-1]:
-                    sql_call = sql_call + ');'
-            else:
-                sql_call = sql_call + ', '
-        return str(sql_call)
-
-    def __sql_gen_list(self, data, table_name):
-        sql_call = 'INSERT OR REPLACE INTO {} VALUES '.format(table_name) + '('
-        table_types = self.get_column_types(table_name)
-        for index, value in enumerate(data):
-            if table_types[index] in ['integer', 'numeric',
-                                      'real', 'none']:
-                sql_call = sql_call + '{}'.format(value)
-            else:
-                sql_call = sql_call + '"{}"'.format(value)
-            if value == data[-1]:
-                sql_call = sql_call + ');'
+        columns = tuple(self.get_column_names(table_name))
+        names = [self.__quote(key) for key in columns]
+        params = [':{}'.format(key.replace('.', '_')) for key in columns]
+        return 'INSERT OR REPLACE INTO {}({}) VALUES ({});'.format(
+            self.__quote(table_name), ', '.join(names), ', '.join(params))
+
+    def __sql_gen_list(self, table_name):
+        dummy = ['?'] * len(self.get_column_names(table_name))
+        return 'INSERT OR REPLACE INTO {} VALUES ({});'.format(
+            self.__quote(table_name), ', '.join(dummy))
+
+    def __insert_sql(self, table_name, kind):
+        statements = self.__statements.setdefault(table_name, {})
+        if kind not in statements:
+            if kind == 'tuple':
+                statements[kind] = self.__sql_gen_tuple(table_name)
+            elif kind == 'list':
+                statements[kind] = self.__sql_gen_list(table_name)
             else:
-                sql_call = sql_call + ', '
-        return sql_call
+                statements[kind] = self.__sql_gen_dict(table_name)
+        return statements[kind]
 
     def __validate_row_data_dict(self, data, table_name):
-        return [x for x in data.keys()
-                if x not in self.get_column_names(table_name)]
+        columns = self.__load_schema(table_name)['names']
+        return [x for x in data.keys() if x not in columns]
+
+    @staticmethod
+    def __sql_type(value):
+        if isinstance(value, (int, bool)):
+            return 'integer'
+        if isinstance(value, float):
+            return 'real'
+        if isinstance(value, str):
+            return 'text'
+        return 'NULL'
+
+    @staticmethod
+    def __peek_tuples(row_data):
+        rows = iter(row_data)
+        first = next(rows, _EMPTY)
+        if first is _EMPTY:
+            return None
+        if not isinstance(first, tuple):
+            raise TypeError('row data is an unsupported type')
+        return itertools.chain([first], rows)
 
     def add_row(self, row_data, table_name='table'):
         """inserts or replaces the row data into the table.
@@ -408,8 +476,10 @@ class SQLOps(object):
         ----------
         row_data : list of values,
                    list of tuples,
+                   iterable of tuples,
                    dict
-            Row data to add to the table.
+            Row data to add to the table. Iterables such as generators are
+            consumed once and streamed into the table.
         table_name : str
             Name of the table to insert or replace the row into.
 
@@ -419,12 +489,19 @@ class SQLOps(object):
 
         """
         self.rotate()
+        self.__checkpoint_wal()
+        if not isinstance(row_data, (list, dict)):
+            rows = self.__peek_tuples(row_data)
+            if rows is not None:
+                self.cursor.executemany(self.__insert_sql(table_name, 'tuple'),
+                                        rows)
+            return
         many_flag = False
         if self.column_exists('ordinal', table_name):
             if isinstance(row_data, list):
                 if isinstance(row_data[0], tuple):
                     many_flag = True
-                    sql_call = self.__sql_gen_tuple(table_name)
+                    sql_call = self.__insert_sql(table_name, 'tuple')
                 else:
                     # some additional validation may need to be done here
                     # as list may have to many values, or not enough.
@@ -433,30 +510,23 @@ class SQLOps(object):
                     if len(row_data) != len(self.get_column_names(
                             table_name)):
                         row_data.insert(0, self.get_next_ordinal(table_name))
-                    sql_call = self.__sql_gen_list(row_data, table_name)
+                    sql_call = self.__insert_sql(table_name, 'list')
             elif isinstance(row_data, dict):
                 self.row = {}
                 if 'ordinal' not in row_data.keys():
                     row_data['ordinal'] = self.get_next_ordinal(table_name)
-                if self.__validate_row_data_dict(row_data, table_name):
-                    for column in self.__validate_row_data_dict(row_data,
-                                                                table_name):
-                        sql_type = 'text'
-                        if isinstance(row_data[column], (int, bool)):
-                            sql_type = 'integer'
-                        elif isinstance(row_data[column], float):
-                            sql_type = 'real'
-                        elif isinstance(row_data[column], str):
-                            sql_type = 'text'
-                        else:
-                            sql_type = 'NULL'
-                        self.add_column(column, sql_type,
-                                        table_name=table_name)
-                for key in [x for x in self.get_column_names(table_name)
-                            if x not in row_data.keys()]:
+                for column in self.__validate_row_data_dict(row_data,
+                                                            table_name):
+                    self.add_column(column, self.__sql_type(row_data[column]),
+                                    table_name=table_name)
+                for key in (set(self.__load_schema(table_name)['names'])
+                            - row_data.keys()):
                     row_data[key] = ''
                 self.row = row_data
-                sql_call = self.__sql_gen_dict(table_name)
+                # Named parameters can not contain '.', see __sql_gen_dict.
+                for key in [x for x in self.row.keys() if '.' in x]:
+                    self.row[key.replace('.', '_')] = self.row[key]
+                sql_call = self.__insert_sql(table_name, 'dict')
 
             else:
                 raise TypeError('row data is an unsupported type')
@@ -464,34 +534,27 @@ class SQLOps(object):
             if isinstance(row_data, list):
                 if isinstance(row_data[0], tuple):
                     many_flag = True
-                    sql_call = self.__sql_gen_tuple(table_name)
+                    sql_call = self.__insert_sql(table_name, 'tuple')
                 else:
-                    sql_call = self.__sql_gen_list(row_data, table_name)
+                    sql_call = self.__insert_sql(table_name, 'list')
             elif isinstance(row_data, dict):
                 self.row = {}
-                if self.__validate_row_data_dict(row_data, table_name):
-                    for column in self.__validate_row_data_dict(row_data,
-                                                                table_name):
-                        if isinstance(row_data[column], (int, bool)):
-                            sql_type = 'integer'
-                        elif isinstance(row_data[column], float):
-                            sql_type = 'real'
-                        elif isinstance(row_data[column], str):
-                            sql_type = 'text'
-                        else:
-                            sql_type = 'NULL'
-                        self.add_column(column, sql_type,
-                                        table_name=table_name)
+                for column in self.__validate_row_data_dict(row_data,
+                                                            table_name):
+                    self.add_column(column, self.__sql_type(row_data[column]),
+                                    table_name=table_name)
                 self.row = row_data
-                sql_call = self.__sql_gen_dict(table_name)
-                print(sql_call)
+                # Named parameters can not contain '.', see __sql_gen_dict.
+                for key in [x for x in self.row.keys() if '.' in x]:
+                    self.row[key.replace('.', '_')] = self.row[key]
+                sql_call = self.__insert_sql(table_name, 'dict')
             else:
                 raise TypeError('row data is an unsupported type')
         if isinstance(row_data, list):
             if many_flag:
                 self.cursor.executemany(sql_call, row_data)
             else:
-                self.cursor.execute(sql_call)
+                self.cursor.execute(sql_call, row_data)
         if isinstance(row_data, dict):
             try:
                 self.cursor.execute(sql_call, self.row)
@@ -499,6 +562,102 @@ class SQLOps(object):
                 print(err)
         return
 
+    def add_rows(self, row_data, table_name='table'):
+        """inserts or replaces a batch of rows in a single transaction.
+
+        Parameters
+        ----------
+        row_data : list of dicts,
+                   list or iterable of tuples
+            Rows to add to the table. Dict keys missing from the table are
+            added as new columns, columns missing from a dict are stored as
+            ''. Tuples must hold a value for every column, in table order.
+            Iterables of tuples are consumed once and streamed into the table.
+        table_name : str
+            Name of the table to insert or replace the rows into.
+
+        Returns
+        -------
+        None
+
+        """
+        self.rotate()
+        if not isinstance(row_data, list):
+            rows = self.__peek_tuples(row_data)
+            if rows is None:
+                return
+        elif not row_data:
+            return
+        elif isinstance(row_data[0], tuple):
+            rows = row_data
+        else:
+            columns = self.get_column_names(table_name)
+            for row in row_data:
+                for column in [x for x in row.keys() if x not in columns]:
+                    self.add_column(column, self.__sql_type(row[column]),
+                                    table_name=table_name)
+                    columns.append(column)
+            if 'ordinal' in columns:
+                ordinal = self.get_next_ordinal(table_name)
+                for row in row_data:
+                    if 'ordinal' not in row.keys():
+                        row['ordinal'] = ordinal
+                        ordinal = ordinal + 1
+            rows = (tuple(row.get(column, '') for column in columns)
+                    for row in row_data)
+        with self.database:
+            self.cursor.executemany(self.__insert_sql(table_name, 'tuple'),
+                                    rows)
+        # Checkpoint once the batch is committed, so it leaves the WAL now.
+        self.__checkpoint_wal()
+        return
+
+    def compile_inserter(self, table_name='table'):
+        """Builds an insert function specialised to the table's schema.
+
+        The function skips add_row's type dispatch and schema checks, so
+        rows must only use existing columns. It still rotates the database
+        and checkpoints the WAL like add_row, so it stays usable across
+        rotations. The columns are fixed when it is built, call
+        compile_inserter again after the table's schema changes.
+
+        Parameters
+        ----------
+        table_name : str
+            Name of the table to build the insert function for.
+
+        Returns
+        -------
+        function
+            Takes a dict, or a list of tuples holding every column in table
+            order, and inserts or replaces it into the table.
+
+        """
+        if table_name not in self.__inserters:
+            columns = tuple(self.get_column_names(table_name))
+            sql_call = self.__insert_sql(table_name, 'tuple')
+            if 'ordinal' in columns:
+                next_ordinal = self.get_next_ordinal
+            else:
+                next_ordinal = None
+
+            def insert(row_data):
+                # rotate() swaps the connection, so look the cursor up here.
+                self.rotate()
+                self.__checkpoint_wal()
+                if isinstance(row_data, dict):
+                    if next_ordinal and 'ordinal' not in row_data:
+                        row_data['ordinal'] = next_ordinal(table_name)
+                    self.cursor.execute(sql_call,
+                                        tuple(row_data.get(column, '')
+                                              for column in columns))
+                else:
+                    self.cursor.executemany(sql_call, row_data)
+                return
+
+            self.__inserters[table_name] = insert
+        return self.__inserters[table_name]
+
     def export_csv(self, filename, sql_filter='', table_name='table'):
         """Exports the table to the specified file as a csv.
 
@@ -517,43 +676,116 @@ class SQLOps(object):
         None
 
         """
-        self.database.row_factory = sqlite3.Row
-        if filter:
-            self.select_rows(sql_filter=sql_filter, table_name=table_name)
-        else:
-            self.select_rows(table_name=table_name)
-        record = self.cursor.fetchone()
+        cursor = self.select_rows(sql_filter=sql_filter,
+                                  table_name=table_name)
+        self.__write_csv(filename, cursor, cursor.fetchmany(10000))
+        return
+
+    @staticmethod
+    def __write_csv(filename, cursor, records):
+        # records is the first batch, already fetched from cursor.
         with open(filename, 'w', newline='') as csv_file:
             writer = csv.writer(csv_file, delimiter=',')
-            writer.writerow(record.keys())
-            while record:
-                writer.writerow(list(record))
-                record = self.cursor.fetchone()
+            writer.writerow([column[0] for column in cursor.description])
+            while records:
+                writer.writerows(records)
+                records = cursor.fetchmany(10000)
+        return
+
+    @staticmethod
+    def __record_batch(names, records, schema=None):
+        columns = list(zip(*records)) or [[] for name in names]
+        if schema is None:
+            arrays = [pyarrow.array(column) for column in columns]
+        else:
+            arrays = [pyarrow.array(column, type=field.type)
+                      for (column, field) in zip(columns, schema)]
+        return pyarrow.RecordBatch.from_arrays(arrays, names=names)
+
+    def export_csv_fast(self, filename, sql_filter='', table_name='table'):
+        """Exports the table to the specified file as a csv using pyarrow.
+
+        Each fetched batch of rows becomes a pyarrow RecordBatch and is
+        streamed to pyarrow's C csv writer, so only one batch is held in
+        memory. Values are quoted and formatted the pyarrow way. The export
+        falls back to export_csv when pyarrow is not installed, and to
+        csv.writer when the first batch has a column that mixes value
+        types, such as '' stored in a real column.
+
+        Parameters
+        ----------
+        filename : string
+            filename and path of the desired csv file.
+        sql_filter : string
+            SQL query language to use for limiting the selection.
+            Default is '' (none)
+        table_name : string
+            Name of the table to export.
+
+        Returns
+        -------
+        None
+
+        """
+        if pyarrow is None:
+            return self.export_csv(filename, sql_filter, table_name)
+        cursor = self.select_rows(sql_filter=sql_filter,
+                                  table_name=table_name)
+        names = [column[0] for column in cursor.description]
+        records = cursor.fetchmany(10000)
+        try:
+            batch = self.__record_batch(names, records)
+        except pyarrow.ArrowException:
+            # Keep the rows already fetched, nothing is read twice.
+            return self.__write_csv(filename, cursor, records)
+        try:
+            with pyarrow.csv.CSVWriter(filename, batch.schema) as writer:
+                while records:
+                    writer.write_batch(batch)
+                    records = cursor.fetchmany(10000)
+                    if records:
+                        batch = self.__record_batch(names, records,
+                                                    batch.schema)
+        except pyarrow.ArrowException:
+            # A later batch does not fit the first batch's types, start over.
+            return self.export_csv(filename, sql_filter, table_name)
         return
 
     def check_time(self):
-        return int(time.time()) >= self.start_time + self.rotation_interval
+        return time.monotonic() >= self.__rotate_at
 
     def rotate(self):
         if self.rotation_interval:
             if self.check_time():
                 new_time = self.start_time + self.rotation_interval
                 filename = self.base_filename + '_{}.db'.format(new_time)
-                tmp_database = SQLOps(filename)
-                for table in self.get_tables():
-                    tmp_database.create_table(table,
-                                              self.get_column_names(table),
-                                              self.get_column_types(table),
-                                              key_name=self.get_pk_name(table))
-                    self.__ordinals[table] = self.get_next_ordinal(table)
-
-                tmp_database.database.commit()
-                tmp_database.database.close()
+                # Copy the table definitions, keys included, on this
+                # connection instead of opening a second SQLOps.
+                self.database.commit()
+                self.cursor.execute('ATTACH DATABASE ? AS new_db;',
+                                    (filename,))
+                for (table, sql_call) in self.cursor.execute(
+                        'SELECT name, sql FROM sqlite_master WHERE type = '
+                        '"table" AND name NOT LIKE "sqlite_%";').fetchall():
+                    self.cursor.execute('CREATE TABLE new_db.{}'.format(
+                        sql_call[len('CREATE TABLE '):]))
+                    if self.column_exists('ordinal', table):
+                        self.__ordinals[table] = self.get_next_ordinal(table)
                 self.database.commit()
+                self.cursor.execute('DETACH DATABASE new_db;')
+                if self.__wal:
+                    self.cursor.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+                row_factory = self.database.row_factory
                 self.database.close()
                 self.start_time = new_time
+                self.__rotate_at = self.__rotate_at + self.rotation_interval
                 self.database = sqlite3.connect(filename)
+                self.database.row_factory = row_factory
                 self.cursor = self.database.cursor()
+                self.__apply_pragmas(filename)
+                self.__schema = {}
+                self.__statements = {}
+                self.__inserters = {}
         pass
 
 